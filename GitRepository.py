@@ -2,18 +2,69 @@
 
 from copy import copy
 from functools import partial
+import html
+from itertools import islice
 import os
-import subprocess
 import re
 import shutil
+import threading
+import time
 
 import sublime
+import sublime_plugin
 
 from .st3_CommandsBase.WindowCommand import stWindowCommand
 from .menu import menu, action, Menu, CheckBox, Action
+from .background import GitStream
+from . import settings
+from . import perf
+from .coalesce import coalescer
+from .processes import process_manager
+from .gitconfig import config_snapshot
+from . import diagnostics
+
+
+LOG_FORMAT = '--format=%d!SEP!%f!SEP!%cN!SEP!%h!SEP!%ar'
+LOG_GRAPH_FORMAT = LOG_FORMAT + '!SEP!%H!SEP!%P'
+LOG_PAGE_SIZE = 500
+LINE_BLAME_WINDOW = 40
+PATHSPEC_CHUNK_SIZE = 200
+
+_git_version = None
+_file_listings = {}
+_blame_stacks = {}
+_line_blames_in_flight = set()
+diagnostics.register_cache("file listings", lambda: len(_file_listings))
+diagnostics.register_cache("blame back stacks", lambda: len(_blame_stacks))
+
+
+class VersionControlReplaceContentCommand(sublime_plugin.TextCommand):
+    def run(self, edit, text):
+        self.view.set_read_only(False)
+        self.view.replace(edit, sublime.Region(0, self.view.size()), text)
+        self.view.set_read_only(True)
+
+
+def git_version(background=False):
+    global _git_version
+    if _git_version is None:
+        out = process_manager.run(None, ["version"], background=background)[0].decode("utf-8")
+        version = tuple(int(v) for v in re.findall(r'\d+', out)[:3])
+        # A background call stopped by an interactive one has no output.
+        if not version:
+            return version
+        _git_version = version
+
+    return _git_version
 
 
 class GitRepositoryCommand(stWindowCommand, Menu):
+    history_search = None
+    comparison = None
+    previewer = None
+    ignore_counts = None
+    ignore_counts_masks = None
+
     def Name(self):
         return "GIT"
 
@@ -35,6 +86,7 @@ class GitRepositoryCommand(stWindowCommand, Menu):
         commands = [
             ("REPOSITORY: Show all modifications...", self.all_modifications()),
             ("REPOSITORY: Show log...", self.log()),
+            ("REPOSITORY: Search history...", self.choose_history_search_mode()),
             ("REPOSITORY: Commit changes...", self.choose_commit_options()),
             ("REPOSITORY: Branches and tags...", self.show_tags_and_branches()),
             ("REPOSITORY: Create branch from HEAD...", self.create_branch()),
@@ -43,6 +95,7 @@ class GitRepositoryCommand(stWindowCommand, Menu):
             ("REPOSITORY: Pull ...", self.choose_pull_options()),
             ("REPOSITORY: Push ...", self.choose_push_options()),
             ("REPOSITORY: Clean", self.clean()),
+            ("REPOSITORY: Diagnostics...", self.diagnostics()),
         ]
 
         if self.window.active_view() and self.window.active_view().file_name():
@@ -56,14 +109,13 @@ class GitRepositoryCommand(stWindowCommand, Menu):
                 ("FILE: Hide blame", self.hide_blame()),
             ])
 
-            modified_files = self.get_all_modified_files()
-            modified_file = [f for f in modified_files if f[0] == active_file]
-            if modified_file:
-                commands.extend(self.get_file_actions(modified_file[0][0], modified_file[0][1]))
+            status = self.get_file_status(active_file)
+            if status:
+                commands.extend(self.get_file_actions(active_file, status))
 
         return commands
 
-    def git(self, args, wait=True, silent=True, output_file=None):
+    def git(self, args, wait=True, silent=True, output_file=None, input=None):
         show_result = not silent and not output_file
         assert wait or not show_result
         msg = ["git"] + args
@@ -74,14 +126,10 @@ class GitRepositoryCommand(stWindowCommand, Menu):
                 return None
 
         print(" ".join(msg))
-        p = subprocess.Popen(
-            ["git"] + args,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            cwd=self.path)
-
-        if wait:
-            out, err = p.communicate()
+        if not wait:
+            process_manager.start(self.path, args, owner=self)
+        else:
+            out, err = coalescer.run(self.path, args, lambda: self.run_git(args, input))
             if output_file:
                 with open(output_file, "wb") as f:
                     f.write(out)
@@ -93,6 +141,9 @@ class GitRepositoryCommand(stWindowCommand, Menu):
                 sublime.message_dialog(out)
             return out
 
+    def run_git(self, args, input=None):
+        return process_manager.run(self.path, args, owner=self, input=input)
+
     @action()
     def diff(self, staged, file_name=None):
         if not file_name:
@@ -194,11 +245,87 @@ class GitRepositoryCommand(stWindowCommand, Menu):
     def choose_file_action(self, file_name, status):
         return self.get_file_actions(file_name, status)
 
-    def get_all_modified_files(self):
-        files = self.git(['status', '--short']).splitlines()
-        files = [[f[3:].strip('"'), f[:2]] for f in files]
+    def status_command(self, untracked_files=None, untracked_cache=None, fsmonitor=None):
+        if untracked_files is None:
+            untracked_files = settings.get("status_untracked_files", self.path, "normal")
+        if untracked_cache is None:
+            untracked_cache = settings.get("status_untracked_cache", self.path, False)
+        if fsmonitor is None:
+            fsmonitor = settings.get("status_fsmonitor", self.path, False)
+
+        options = []
+        if untracked_cache and untracked_files != "no" and git_version() >= (2, 8):
+            options += ['-c', 'core.untrackedCache=true']
+
+        # The builtin fsmonitor daemon exists only on Windows and macOS.
+        if fsmonitor and git_version() >= (2, 36) and sublime.platform() in ("windows", "osx"):
+            options += ['-c', 'core.fsmonitor=true']
+
+        return options + ['status', '--porcelain', '-z', '--untracked-files=' + untracked_files]
+
+    def status_pathspecs(self, scope=None):
+        if scope is None:
+            scope = settings.get("status_scope", self.path, "repository")
+
+        if scope == "active_folder":
+            view = self.window.active_view()
+            if view and view.file_name():
+                folder = os.path.relpath(os.path.dirname(view.file_name()), self.path)
+                if not folder.startswith(os.pardir):
+                    return [folder]
+
+        if scope == "pathspecs":
+            return settings.get("status_pathspecs", self.path, [])
+
+        return []
+
+    @staticmethod
+    def parse_status(out):
+        """Parses "git status --porcelain -z" into [path, status] pairs.
+
+        Paths are not quoted, renamed and copied files get their new path.
+        """
+        files = []
+        entries = iter(out.split('\0'))
+        for entry in entries:
+            if not entry:
+                continue
+
+            files.append([entry[3:], entry[:2]])
+            if entry[0] in 'RC':
+                next(entries, None)
+
         return files
 
+    def warm_up_commands(self, file_name=None):
+        """Returns git calls which the first opened menus make.
+
+        These are the very calls of the initial menu for the file, the
+        modifications, log and branches menus, so git finds their data in
+        the OS file cache.
+        """
+        commands = [self.file_status_command(file_name)] if file_name else []
+        return commands + [
+            self.all_status_command(),
+            self.log_command(),
+            ['branch', '--all'],
+            ['tag'],
+        ]
+
+    def all_status_command(self):
+        pathspecs = self.status_pathspecs()
+        return self.status_command() + (['--'] + pathspecs if pathspecs else [])
+
+    def file_status_command(self, file_name):
+        return self.status_command(untracked_files="normal") + ['--', file_name]
+
+    def get_all_modified_files(self):
+        return self.parse_status(self.git(self.all_status_command()))
+
+    def get_file_status(self, file_name):
+        files = self.parse_status(self.git(self.file_status_command(file_name)))
+        return files[0][1] if files else None
+
     @staticmethod
     def get_status_str(status):
         while len(status) < 2:
@@ -223,8 +350,62 @@ class GitRepositoryCommand(stWindowCommand, Menu):
             ("Remove all from index", self.remove_all_modifications_from_index()),
             ("Add all to index exclude .orig", self.add_all_modifications_to_index_exclude_orig()),
             ("Add all to index exclude new files", self.add_all_modifications_to_index_update()),
+            ("Select files...", self.select_modified_files()),
         ]
 
+    @menu(temp=True)
+    def select_modified_files(self):
+        return [
+            ("Add selected to index", self.apply_to_selected_files(args=['add'])),
+            ("Remove selected from index", self.apply_to_selected_files(
+                args=['reset', '-q', 'HEAD'], tracked_only=True)),
+            ("Revert selected changes", self.apply_to_selected_files(
+                args=['checkout'], tracked_only=True, confirm="revert all changes in")),
+        ] + ([
+            ("Restore selected from HEAD", self.apply_to_selected_files(
+                args=['restore', '--source=HEAD', '--staged', '--worktree'],
+                tracked_only=True,
+                in_head_only=True,
+                confirm="restore index and working tree of")),
+        ] if git_version() >= (2, 23) else []) + [
+            CheckBox(self.get_status_str(f[1]) + '\t' + f[0], id=f[0])
+            for f in self.get_all_modified_files()
+        ]
+
+    @action()
+    def apply_to_selected_files(self, args, options=None, tracked_only=False, in_head_only=False, confirm=None):
+        files = options or []
+        statuses = dict(self.get_all_modified_files()) if tracked_only or in_head_only else {}
+        if tracked_only:
+            files = [f for f in files if statuses.get(f) != '??']
+
+        # Restoring from HEAD deletes files which are not in HEAD yet.
+        skipped = []
+        if in_head_only:
+            skipped = [f for f in files if statuses.get(f, ' ')[0] in 'ARC']
+            files = [f for f in files if f not in skipped]
+
+        if not files:
+            sublime.message_dialog("No files selected" + (
+                ", new files are skipped:\n" + "\n".join(skipped) if skipped else ""))
+            return
+
+        message = "Do you really want to {} {} files?".format(confirm, len(files))
+        if skipped:
+            message += "\n\nNew files are skipped:\n" + "\n".join(skipped)
+        if confirm and not sublime.ok_cancel_dialog(message):
+            return
+
+        if git_version() < (2, 25):
+            for i in range(0, len(files), PATHSPEC_CHUNK_SIZE):
+                self.git(args + ['--'] + files[i:i + PATHSPEC_CHUNK_SIZE])
+            return
+
+        # Paths go through stdin, so any number of them is one git process.
+        self.git(
+            args + ['--pathspec-from-file=-', '--pathspec-file-nul'],
+            input='\0'.join(files).encode("utf-8"))
+
     @menu(refresh=True)
     def all_modifications(self):
         return ([
@@ -250,7 +431,7 @@ class GitRepositoryCommand(stWindowCommand, Menu):
         def make_commit(message):
             self.git(["commit", "-m", message] + (['--amend'] if amend else []))
 
-        bugtraqMsg = self.git(['config', 'bugtraq.message'])
+        bugtraqMsg = config_snapshot(self.path).get('bugtraq.message')
         def request_bug_id(message):
             if not bugtraqMsg:
                 make_commit(message)
@@ -286,20 +467,35 @@ class GitRepositoryCommand(stWindowCommand, Menu):
             None,
             None)
 
-    @menu()
-    def log(self, path=None, commit=None):
+    def log_item(self, line, graph=''):
         TAG = 0
         TITLE = 1
         AUTHOR = 2
         HASH = 3
         DATE = 4
 
+        c = line.split("!SEP!")
+        return Action(
+            text=[
+                (graph + ' ' if graph else '') + c[TITLE].replace('-', ' ') + '\t' + c[HASH],
+                (c[TAG] + " " if c[TAG] else "") + c[AUTHOR] + " " + c[DATE],
+            ],
+            func=self.show_commit(commit=c[HASH]),
+            id=c[HASH],
+            preview=('show', '--stat', '--format=medium', c[HASH]))
+
+    def log_graph(self, path=None):
+        # Lanes are meaningless for path limited history, it is followed
+        # through renames and its parents are not rewritten.
+        return not path and settings.get("log_graph", self.path, False)
+
+    def log_command(self, path=None, commit=None):
         cmd = [
             "log",
             "--date-order",
             '--oneline',
             '-10000',
-            '--format=%d!SEP!%f!SEP!%cN!SEP!%h!SEP!%ar']
+            LOG_GRAPH_FORMAT if self.log_graph(path) else LOG_FORMAT]
         if path:
             if os.path.isfile(os.path.join(self.path, path)):
                 cmd = cmd + ['--follow']
@@ -309,18 +505,150 @@ class GitRepositoryCommand(stWindowCommand, Menu):
         if commit:
             cmd = cmd + [commit]
 
-        commits = [c.split("!SEP!") for c in self.git(cmd).splitlines()]
+        return cmd
 
+    @menu()
+    def log(self, path=None, commit=None):
+        graph = self.log_graph(path)
+        if path and os.path.isfile(os.path.join(self.path, path)):
+            from .maintenance import note_path
+
+            note_path(self.path, path)
+
+        cmd = self.log_command(path, commit)
+        if not graph:
+            return [self.log_item(c) for c in self.git(cmd).splitlines()]
+
+        from .graph import LaneGraph
+
+        # Pages are read from git output as it comes, the whole log is never
+        # held as text.
+        print(" ".join(["git"] + cmd))
+        lanes = LaneGraph()
+        items = []
+        p = process_manager.spawn(self.path, cmd, owner=self)
+        try:
+            while True:
+                page = [line.decode("utf-8").rstrip('\n') for line in islice(p.stdout, LOG_PAGE_SIZE)]
+                if not page:
+                    break
+
+                rows = lanes.add_page([
+                    (c[-2], c[-1].split()) for c in (line.split("!SEP!") for line in page)])
+                items.extend(self.log_item(c, row) for c, row in zip(page, rows))
+
+            # Git writes only a short message there, it can not fill the pipe.
+            err = p.stderr.read()
+        finally:
+            p.stdout.close()
+            p.stderr.close()
+            p.wait()
+            process_manager.finish(self.path, p)
+
+        if err:
+            sublime.message_dialog(err.decode("utf-8"))
+        return items
+
+    @menu(temp=True)
+    def choose_history_search_mode(self):
         return [
-            (
-                [
-                    c[TITLE].replace('-', ' ') + '\t' + c[HASH],
-                    (c[TAG] + " " if c[TAG] else "") + c[AUTHOR] + " " + c[DATE],
-                ],
-                self.show_commit(commit=c[HASH]),
-            ) for c in commits
+            ("Search in commit messages...", self.search_history(mode='--grep=')),
+            ("Search by author...", self.search_history(mode='--author=')),
+            ("Search changes adding or removing string (-S)...", self.search_history(mode='-S')),
+            ("Search changes matching regex (-G)...", self.search_history(mode='-G')),
         ]
 
+    @action(terminate=True)
+    def search_history(self, mode):
+        def impl(query):
+            self.start_history_search(mode, query)
+            self.history_search_results()()
+
+        self.window.show_input_panel(
+            "Search history:",
+            "",
+            impl,
+            None,
+            None)
+
+    def start_history_search(self, mode, query):
+        self.stop_history_search()
+
+        cmd = ["log", "--date-order", LOG_FORMAT, mode + query]
+        if mode in ('--grep=', '--author='):
+            cmd.append('--regexp-ignore-case')
+
+        search = GitStream(
+            self.path,
+            cmd,
+            owner=self,
+            on_batch=lambda lines: self.on_history_search_batch(search, lines),
+            on_done=lambda: self.refreshMenu('history_search_results'))
+        search.query = mode + query
+        search.results = []
+        self.history_search = search.start()
+
+    def on_history_search_batch(self, search, lines):
+        search.results.extend(self.log_item(line) for line in lines if line)
+        self.refreshMenu('history_search_results')
+
+    def stop_history_search(self):
+        if self.history_search:
+            self.history_search.cancel()
+
+    def onMenuHighlight(self, actions, index):
+        if not settings.get("preview_on_highlight", self.path, True):
+            return
+
+        previews = [a.preview for a in actions]
+        if self.previewer is None:
+            if not any(previews):
+                return
+            from .preview import Previewer
+
+            self.previewer = Previewer(self.window, self.path, self)
+
+        self.previewer.highlight(previews, index)
+
+    def hide_preview(self):
+        if self.previewer:
+            self.previewer.hide()
+
+    def onMenuSelect(self, actions, index):
+        self.hide_preview()
+
+    def onMenuCancel(self):
+        self.hide_preview()
+        self.stop_history_search()
+        if self.comparison:
+            self.comparison.cancel()
+        process_manager.cancel(self)
+
+    @menu(refresh=True)
+    def history_search_results(self):
+        search = self.history_search
+        if search.is_running():
+            status = Action(
+                text=["Searching... {} commits found".format(len(search.results)), "Select to stop search"],
+                func=self.action(self.stop_history_search),
+                id='status')
+        elif search.error:
+            status = Action(
+                text=["Search failed: " + search.error.splitlines()[0], search.query],
+                func=self.none(),
+                id='status')
+        else:
+            status = Action(
+                text=[
+                    ("Search stopped: " if search.cancelled else "Found ") +
+                    "{} commits".format(len(search.results)),
+                    search.query
+                ],
+                func=self.none(),
+                id='status')
+
+        return [status] + search.results
+
     @menu()
     def chooseFolderForLog(self, path, commit=None):
         folders = []
@@ -351,6 +679,7 @@ class GitRepositoryCommand(stWindowCommand, Menu):
             ("Copy message to clipboard", self.copy_commit_message(commit=commit)),
             ("Show commit message", self.show_commit_message(commit=commit)),
             ("Show log ...", self.log(commit=commit)),
+            ("Compare with ...", self.choose_compare_target(commit=commit)),
             ("Make revert commit", self.make_revert_commit(commit=commit)),
             ("Create branch from " + view, self.create_branch(commit=commit)),
             ("Reset to " + view + " ... ", self.choose_reset_options(commit=commit)),
@@ -373,9 +702,10 @@ class GitRepositoryCommand(stWindowCommand, Menu):
         return [
             ("choose action ...", self.choose_commit_action(commit=commit)),
         ] + [
-            (
-                self.get_status_str(f[0]) + '\t' + f[1],
-                self.choose_file_in_commit_action(commit=commit, file_name=f[1], status=f[0])
+            Action(
+                text=self.get_status_str(f[0]) + '\t' + f[1],
+                func=self.choose_file_in_commit_action(commit=commit, file_name=f[1], status=f[0]),
+                preview=('show', '--format=', commit, '--', f[1]),
             ) for f in files
         ]
 
@@ -421,6 +751,7 @@ class GitRepositoryCommand(stWindowCommand, Menu):
             ("FILE: Diff", self.diff_for_file_in_commit(commit=commit, file=file_name)),
             ("FILE: Revert to this revision", self.revert_file_to_revision(commit=commit, file=file_name)),
             ("FILE: Revert to previous revision", self.revert_file_to_revision(commit=commit + '^', file=file_name)),
+            ("FILE: Blame this revision", self.blame_revision(commit=commit, file=file_name)),
         ]
 
         return actions
@@ -452,27 +783,179 @@ class GitRepositoryCommand(stWindowCommand, Menu):
         ]
 
 
-    @action(terminate=True)
-    def blame_file(self, path, fromRevision=None):
-        view = self.window.active_view()
-        view.erase_phantoms ("git blame")
-        phantoms = []
-        row = 0
-        command =  ['blame', path]
-        # if fromRevision not is None:
-        #     command += [fromRevision + "^"]
-        #     view =
-
-        for line in self.git(command).splitlines():
-            commit, text = line.split(' ', 1)
+    def get_blame(self, path, revision=None):
+        """Returns blame of the file, blames of revisions are cached."""
+        from .blame import parse_porcelain, blame_cache
+
+        if revision is None:
+            return parse_porcelain(self.git(['blame', '--porcelain', '--', path])), None
+
+        key = (self.path, revision, path)
+        cached = blame_cache.get(key)
+        if cached is not None:
+            return cached
+
+        outputs = []
+        for args in (['blame', '--porcelain', revision, '--', path], ['show', revision + ':' + path]):
+            print(" ".join(["git"] + args))
+            out, err = coalescer.run(self.path, args, lambda: self.run_git(args))
+            if err:
+                # Failures are not cached, the next visit runs git again.
+                sublime.message_dialog(err.decode("utf-8"))
+                return [], ''
+            outputs.append(out.decode("utf-8"))
+
+        cached = (parse_porcelain(outputs[0]), outputs[1])
+        blame_cache.put(key, cached)
+        return cached
+
+    def show_blame(self, view, lines):
+        from .blame import NOT_COMMITTED
+
+        view.erase_phantoms("git blame")
+        stack = _blame_stacks.get(view.id())
+        for row, line in enumerate(lines):
+            text = html.escape(line.author) + ' ' + time.strftime('%Y-%m-%d', time.localtime(line.time))
+            if line.commit != NOT_COMMITTED:
+                text = '<a href="show:{0}">{1}</a> {2}'.format(line.commit, line.commit[:8], text)
+            if line.previous:
+                text += ' <a href="previous:{}">&lt;&lt;</a>'.format(row)
+            if row == 0 and stack:
+                text = '<a href="back:">back</a> ' + text
+
             pos = view.text_point(row, 0)
-            view.add_phantom (
+            view.add_phantom(
                 "git blame",
                 sublime.Region(pos, pos),
-                '<a href=' + commit + '>'+commit+'</a> ' + text[:text.index('+')-1].replace("  ", " .").replace("(", ""),
+                text,
                 sublime.LAYOUT_INLINE,
-                on_navigate=lambda href: self.show_commit(commit=href)())
-            row += 1
+                on_navigate=partial(self.on_blame_navigate, view, lines))
+
+    def on_blame_navigate(self, view, lines, href):
+        command, _, argument = href.partition(':')
+        if command == 'show':
+            self.show_commit(commit=argument)()
+        elif command == 'previous':
+            revision, path = lines[int(argument)].previous
+            self.open_blame_revision(view, revision, path)
+        elif command == 'back':
+            stack = _blame_stacks.get(view.id())
+            stack.pop()
+            if stack:
+                self.open_blame_revision(view, *stack.pop())
+            else:
+                del _blame_stacks[view.id()]
+                view.close()
+
+    def open_blame_revision(self, view, revision, path):
+        """Shows blame of a file revision in the scratch blame view.
+
+        Every shown revision is pushed onto the back stack of the view.
+        """
+        if view is None or view.id() not in _blame_stacks:
+            source = view
+            view = self.window.new_file()
+            view.set_scratch(True)
+            if source:
+                view.assign_syntax(source.settings().get('syntax'))
+            _blame_stacks[view.id()] = []
+
+        lines, content = self.get_blame(path, revision)
+        _blame_stacks[view.id()].append((revision, path))
+        view.set_name("Blame: {} @ {}".format(os.path.basename(path), revision[:8]))
+        view.run_command("version_control_replace_content", {"text": content})
+        self.show_blame(view, lines)
+
+    @action(terminate=True)
+    def blame_revision(self, commit, file):
+        self.open_blame_revision(self.window.active_view(), commit, file)
+
+    @action(terminate=True)
+    def blame_file(self, path):
+        from .blame import line_blame_cache, content_id, head_id
+        from .maintenance import note_path
+
+        note_path(self.path, path)
+        head = head_id(self.path)
+        blob = content_id(self.full_path(path))
+        lines = self.get_blame(path)[0]
+        if lines:
+            line_blame_cache.put((self.path, path, head, blob), lines)
+        self.show_blame(self.window.active_view(), lines)
+
+    def get_line_blame(self, path, row, on_done):
+        """Calls on_done with blame of the row of the working tree file.
+
+        Rows are blamed by windows of LINE_BLAME_WINDOW lines in background.
+        Blames of windows and of whole files are cached by the path, HEAD
+        and the file content id, so hovering over the same region never
+        starts git again until any of them changes, even when git fails.
+        """
+        from .blame import parse_porcelain, line_blame_cache, content_id, line_count, head_id
+
+        full_path = self.full_path(path)
+        head = head_id(self.path)
+        blob = content_id(full_path)
+        lines_in_file = line_count(full_path)
+        if row >= lines_in_file:
+            return
+
+        lines = line_blame_cache.get((self.path, path, head, blob))
+        start = 0
+        if lines is None:
+            start = row // LINE_BLAME_WINDOW * LINE_BLAME_WINDOW
+            key = (self.path, path, head, blob, start)
+            lines = line_blame_cache.get(key)
+
+        if lines is not None:
+            if row - start < len(lines):
+                on_done(lines[row - start])
+            return
+
+        if key in _line_blames_in_flight:
+            return
+        _line_blames_in_flight.add(key)
+
+        def impl():
+            args = [
+                'blame',
+                '--porcelain',
+                '-L', '{},{}'.format(start + 1, min(start + LINE_BLAME_WINDOW, lines_in_file)),
+                '--',
+                path]
+            try:
+                out, err = coalescer.run(self.path, args, lambda: self.run_git(args))
+            finally:
+                _line_blames_in_flight.discard(key)
+
+            # A failed blame, e.g. of an untracked file, is cached as empty.
+            lines = [] if err else parse_porcelain(out.decode("utf-8", "replace"))
+            line_blame_cache.put(key, lines)
+            if row - start < len(lines):
+                sublime.set_timeout(lambda: on_done(lines[row - start]), 0)
+
+        threading.Thread(target=impl, daemon=True).start()
+
+    def show_line_blame(self, view, point):
+        from .blame import NOT_COMMITTED
+
+        path = os.path.relpath(view.file_name(), self.path)
+        row = view.rowcol(point)[0]
+
+        def on_done(line):
+            text = html.escape(line.author) + ', ' + time.strftime('%Y-%m-%d', time.localtime(line.time))
+            if line.commit != NOT_COMMITTED:
+                text = '<a href="{0}">{1}</a> {2}<br>{3}'.format(
+                    line.commit, line.commit[:8], text, html.escape(line.summary))
+
+            view.show_popup(
+                text,
+                sublime.HIDE_ON_MOUSE_MOVE_AWAY,
+                point,
+                600,
+                on_navigate=lambda commit: self.show_commit(commit=commit)())
+
+        self.get_line_blame(path, row, on_done)
 
     @action(terminate=True)
     def hide_blame(self):
@@ -484,12 +967,61 @@ class GitRepositoryCommand(stWindowCommand, Menu):
         with open(os.path.join(self.path, '.gitignore'), 'a') as f:
             f.write(mask + '\n')
 
+        _file_listings.pop(self.path, None)
+        self.ignore_counts_masks = None
+
+    def get_file_listing(self):
+        """Returns sorted lists of tracked and untracked not ignored files.
+
+        The listing is shared by all commands for a short time, while the
+        index is not changed.
+        """
+        index = os.path.join(self.path, '.git', 'index')
+        stamp = os.path.getmtime(index) if os.path.exists(index) else None
+        cached = _file_listings.get(self.path)
+        if cached and cached[0] == stamp and time.time() - cached[1] < 30:
+            return cached[2], cached[3]
+
+        args = ['ls-files', '-z', '-t', '--cached', '--others', '--exclude-standard']
+        out = coalescer.run(self.path, args, lambda: self.run_git(args))[0]
+        tracked = []
+        untracked = []
+        for entry in out.decode("utf-8", "replace").split('\0'):
+            if entry:
+                (untracked if entry[0] == '?' else tracked).append(entry[2:])
+
+        tracked.sort()
+        untracked.sort()
+        _file_listings[self.path] = (stamp, time.time(), tracked, untracked)
+        return tracked, untracked
+
+    def count_ignore_matches(self, masks):
+        from .gitignore import Pattern
+
+        counts = self.ignore_counts = {}
+        self.ignore_counts_masks = masks
+
+        def impl():
+            tracked, untracked = self.get_file_listing()
+            refreshed = 0
+            for i, mask in enumerate(masks):
+                if self.ignore_counts is not counts:
+                    return
+
+                pattern = Pattern(mask.replace(os.path.sep, '/'))
+                counts[mask] = (pattern.count(tracked), pattern.count(untracked))
+                if i == len(masks) - 1 or time.time() - refreshed > 0.3:
+                    refreshed = time.time()
+                    sublime.set_timeout(lambda: self.refreshMenu('add_to_gitignore'), 0)
+
+        threading.Thread(target=impl, daemon=True).start()
+
     @menu(temp=True)
     def add_to_gitignore(self, path):
         path = os.path.normpath(path)
-        actions = []
+        masks = []
         def add_ignore_mask(mask):
-            actions.append((mask, self.append_ignore(mask)))
+            masks.append(mask)
 
         exts = os.path.basename(path).split('.')[1:]
 
@@ -516,7 +1048,20 @@ class GitRepositoryCommand(stWindowCommand, Menu):
                 add_ignore_mask(os.path.sep + os.path.sep.join(paths + ['*']))
             paths = paths[:-1]
 
-        return actions, selected
+        if self.ignore_counts_masks != masks:
+            self.count_ignore_matches(masks)
+        counts = self.ignore_counts
+
+        def text(mask):
+            if mask not in counts:
+                return mask + '\tcounting files...'
+
+            return mask + '\t{} tracked, {} untracked files'.format(*counts[mask])
+
+        return [
+            Action(text=text(mask), func=self.append_ignore(mask), id=mask)
+            for mask in masks
+        ], selected
 
     @menu()
     def show_tags_and_branches(self):
@@ -576,9 +1121,105 @@ class GitRepositoryCommand(stWindowCommand, Menu):
             ("Checkout " + branch, self.checkout(commit=branch)),
             ("Reset " + branch + ' ...', self.choose_reset_options(commit=branch)),
             ("Delete " + branch, self.delete_branch(commit=branch)),
+            ("Compare with ...", self.choose_compare_target(commit=branch)),
         ] if not active_branch else [
+            ("Compare with ...", self.choose_compare_target(commit=branch[1:].strip())),
+        ]
+
+    @menu(temp=True)
+    def choose_compare_target(self, commit):
+        refs = self.git([
+            'for-each-ref',
+            '--format=%(refname:short)',
+            'refs/heads',
+            'refs/remotes',
+            'refs/tags']).splitlines()
+        return [
+            ("Enter revision...", self.enter_compare_target(commit=commit)),
+        ] + [
+            ("Compare " + commit + " with " + ref, self.compare_revisions(base=commit, target=ref))
+            for ref in refs if ref != commit
         ]
 
+    @action(terminate=True)
+    def enter_compare_target(self, commit):
+        self.window.show_input_panel(
+            "Compare " + commit + " with revision:",
+            "",
+            lambda target: self.compare_revisions(base=commit, target=target)(),
+            None,
+            None)
+
+    def start_comparison(self, base, target):
+        from .compare import Comparison
+
+        if self.comparison:
+            self.comparison.cancel()
+
+        comparison = self.comparison = Comparison(base, target)
+        options = [
+            '-r',
+            '-z',
+            '-M',
+            '-l{}'.format(settings.get("compare_rename_limit", self.path, 1000)),
+            base,
+            target]
+
+        def refresh():
+            self.refreshMenu('compare_revisions')
+
+        def on_raw(tokens):
+            for f in comparison.add_raw(tokens):
+                f.action = Action(
+                    text=self.compared_file_text(f),
+                    func=self.diff_between_revisions(base=base, target=target, file=f.path, old_file=f.old_path),
+                    id=f.path)
+            refresh()
+
+        def on_numstat(tokens):
+            for f in comparison.add_numstat(tokens):
+                if f.action:
+                    f.action.text = self.compared_file_text(f)
+            refresh()
+
+        comparison.streams = [
+            GitStream(self.path, ['diff-tree', '--raw'] + options, on_raw, on_done=refresh,
+                      sep=b'\0', batch_size=5000, owner=self).start(),
+            GitStream(self.path, ['diff-tree', '--numstat'] + options, on_numstat, on_done=refresh,
+                      sep=b'\0', batch_size=5000, owner=self).start(),
+        ]
+
+    @staticmethod
+    def compared_file_text(f):
+        text = f.status + '\t' + (f.old_path + ' -> ' if f.old_path else '') + f.path
+        if f.added is not None:
+            text += '\t+{} -{}'.format(f.added, f.deleted)
+        return text
+
+    @menu(refresh=True)
+    def compare_revisions(self, base, target):
+        comparison = self.comparison
+        if (comparison is None or (comparison.base, comparison.target) != (base, target) or
+                comparison.is_cancelled()):
+            self.start_comparison(base, target)
+            comparison = self.comparison
+
+        status = "{} files changed between {} and {}".format(len(comparison.files), base, target)
+        if comparison.error:
+            status = "Comparing {} and {} failed: {}".format(base, target, comparison.error.splitlines()[0])
+        elif comparison.is_running():
+            status += " (loading...)"
+
+        return [
+            Action(text=status, func=self.none(), id='status'),
+        ] + [f.action for f in comparison.files]
+
+    @action()
+    def diff_between_revisions(self, base, target, file, old_file=None):
+        self.git(
+            ["difftool", "-M", base, target, '--'] + ([old_file] if old_file else []) + [file],
+            wait=False)
+
     @action(terminate=True)
     def checkout(self, commit):
         assert commit
@@ -659,3 +1300,105 @@ class GitRepositoryCommand(stWindowCommand, Menu):
     @action()
     def remove_all_modifications_from_index(self):
         self.git(['reset', 'HEAD', '--', '.'])
+
+    @menu(temp=True)
+    def diagnostics(self):
+        return [
+            ("Benchmark status strategies", self.benchmark_status()),
+            ("Show git request statistics", self.show_request_statistics()),
+            ("Show running git processes", self.show_running_processes()),
+            ("Benchmark .gitignore masks on 500k paths", self.benchmark_gitignore()),
+            ("Benchmark log graph on synthetic history", self.benchmark_log_graph()),
+            ("Memory: take snapshot", self.memory_snapshot()),
+            ("Memory: compare last two snapshots", self.memory_difference()),
+            ("Memory: stop tracing", self.action(diagnostics.stop_tracing)),
+        ]
+
+    @action()
+    def memory_snapshot(self):
+        diagnostics.report_snapshot(diagnostics.take_snapshot())
+        for name, count in diagnostics.live_instances([Action, CheckBox, GitRepositoryCommand]):
+            print("[memory] live {} objects: {}".format(name, count))
+        for name, size in diagnostics.cache_sizes():
+            print("[memory] {}: {} items".format(name, size))
+
+    @action()
+    def memory_difference(self):
+        diagnostics.report_difference()
+
+    @action()
+    def benchmark_log_graph(self):
+        from .graph import LaneGraph
+        import random
+
+        # Every tenth commit merges a side branch forked up to 60 commits ago.
+        count = 200000
+        rnd = random.Random(0)
+        commits = [
+            (str(i), [str(i + 1)] + ([str(i + rnd.randint(2, 60))] if i % 10 == 0 else []))
+            for i in range(count)
+        ]
+
+        lanes = []
+
+        def run():
+            graph = LaneGraph()
+            for start in range(0, count, LOG_PAGE_SIZE):
+                graph.add_page(commits[start:start + LOG_PAGE_SIZE])
+            lanes.append(graph.max_lanes)
+
+        timings = perf.measure(run, repeat=3)
+        perf.report(
+            "log graph for {} commits with {} merges (max {} lanes)".format(count, count // 10, lanes[0]),
+            timings)
+
+    @action()
+    def benchmark_gitignore(self):
+        from .gitignore import Pattern
+
+        exts = ['py', 'pyc', 'txt', 'tar.gz', 'cpp', 'h', 'orig']
+        paths = sorted(
+            'src/module{}/package{}/file{}.{}'.format(i // 5000, i // 100 % 50, i, exts[i % len(exts)])
+            for i in range(500000))
+
+        for mask in ['*.pyc', '*.tar.gz', '*.gz', 'file123.py', '/src/module7/*', '/src/module7/package3/*.h', 'package1?/', '**/package4/*.orig']:
+            pattern = Pattern(mask)
+            matches = []
+            timings = perf.measure(lambda: matches.append(pattern.count(paths)), repeat=3)
+            perf.report("count {} in 500k paths ({} matches)".format(mask, matches[0]), timings)
+
+    @action()
+    def show_running_processes(self):
+        now = time.time()
+        for path, p in process_manager.running():
+            print("[perf] {} (pid {}, {:.1f} s): git {}".format(
+                path, p.pid, now - p.started, " ".join(p.git_args)))
+
+    @action()
+    def show_request_statistics(self):
+        print("[perf] git requests: " + ", ".join(
+            "{} {}".format(name, value) for name, value in sorted(coalescer.stats().items())))
+
+    @action()
+    def benchmark_status(self):
+        strategies = [
+            ("whole repository", {}, []),
+            ("whole repository, no untracked", {'untracked_files': "no"}, []),
+            ("whole repository, no caches", {'untracked_cache': False, 'fsmonitor': False}, []),
+            ("active folder", {}, self.status_pathspecs("active_folder")),
+            ("configured pathspecs", {}, self.status_pathspecs("pathspecs")),
+        ]
+
+        view = self.window.active_view()
+        if view and view.file_name():
+            strategies.append(
+                ("active file", {}, [os.path.relpath(view.file_name(), self.path)]))
+
+        for name, options, pathspecs in strategies:
+            if name != "whole repository" and not options and not pathspecs:
+                continue
+
+            cmd = self.status_command(**options) + (['--'] + pathspecs if pathspecs else [])
+            perf.report(
+                "git status, " + name,
+                perf.measure(lambda: self.git(cmd), repeat=5))
@@ -1,9 +1,12 @@
 
 import sublime, sublime_plugin
-import os, glob, subprocess
+import os, glob
 import webbrowser
 import re
 
+from .gitconfig import config_snapshot
+from .processes import process_manager
+
 class OpenOnGitlabCommand(sublime_plugin.WindowCommand):
 
     def run(self, params = []):
@@ -11,7 +14,7 @@ class OpenOnGitlabCommand(sublime_plugin.WindowCommand):
         print (url)
         webbrowser.open(url)
 
-    def getRelativePath(self):
+    def getRepositoryRoot(self):
         folder, path = os.path.split(self.window.active_view().file_name())
         def isAGitRoot(folder):
             return os.path.exists(os.path.join(folder, ".git"))
@@ -19,19 +22,19 @@ class OpenOnGitlabCommand(sublime_plugin.WindowCommand):
         while not isAGitRoot(folder):
             next_folder, sub = os.path.split(folder)
             if folder == next_folder:
-                return None
+                return None, None
 
             folder = next_folder
             path = sub + '/' + path
 
-        return path
+        return folder, path
+
+    def getRelativePath(self):
+        return self.getRepositoryRoot()[1]
 
     def getLink(self):
-        p = subprocess.Popen(["git", "config", "--get", "remote.origin.url"],
-            stdout=subprocess.PIPE,
-            cwd=os.path.dirname(self.window.active_view().file_name()))
-        url, err = p.communicate()
-        url = url.decode().strip()
+        root = self.getRepositoryRoot()[0]
+        url = config_snapshot(root).get("remote.origin.url", "").strip()
         url = re.sub('[^/@]*@', '', url)
         if not url.startswith("https://"):
             url = "https://" + re.sub(':', '/', url)
@@ -39,16 +42,10 @@ class OpenOnGitlabCommand(sublime_plugin.WindowCommand):
         if len(url) > 4 and url[-4:] == ".git":
             url = url[:-4]
 
-        p = subprocess.Popen(["git", "rev-parse", "--abbrev-ref", "HEAD"],
-            stdout=subprocess.PIPE,
-            cwd=os.path.dirname(self.window.active_view().file_name()))
-        branch, err = p.communicate()
+        branch, err = process_manager.run(root, ["rev-parse", "--abbrev-ref", "HEAD"])
         branch = branch.decode().strip()
 
-        p = subprocess.Popen(["git", "rev-parse", "origin/" + branch],
-            stdout=subprocess.PIPE,
-            cwd=os.path.dirname(self.window.active_view().file_name()))
-        revision, err = p.communicate()
+        revision, err = process_manager.run(root, ["rev-parse", "origin/" + branch])
         revision = revision.decode().strip()
 
         row, col = self.window.active_view().rowcol(self.window.active_view().sel()[0].begin())
@@ -1,32 +1,115 @@
-import sublime, os
+import sublime, sublime_plugin, os, time
 from glob import glob
 from .st3_CommandsBase.WindowCommand import stWindowCommand
 # from .SvnRepository import SvnRepositoryCommand
-from .GitRepository import GitRepositoryCommand
+from .GitRepository import GitRepositoryCommand, git_version
 from .menu import Menu, menu
+from . import settings
+
+# Repositories found for folders of opened files. Folders without
+# repositories are not cached, so new repositories are always found.
+_repositories = {}
+
+# Times to the first menu of the F9 command, by warm-up state.
+_first_menu_timings = {}
+
+
+def FindRepositories(path):
+    folder = path
+    if folder in _repositories:
+        return _repositories[folder]
+
+    repositories = []
+    while True:
+        # if glob(path + "\\.svn") != []:
+        #     repositories += [SvnRepositoryCommand(Self.window, path)]
+        # if glob(path + "\\.hg") != []:
+        #     repositories += [SvnRepositoryCommand(Self.window, path)]
+        if glob(os.path.join(path, ".git")) != []:
+            repositories += [path]
+
+        newpath = os.path.dirname(path)
+        if newpath == path:
+            break
+        path = newpath
+
+    if repositories:
+        _repositories[folder] = repositories
+    return repositories
+
+
+def WarmUp(view):
+    if not view.file_name() or not view.window():
+        return
+
+    from .warmup import warm_up
+    from .maintenance import schedule
+
+    for path in FindRepositories(os.path.dirname(view.file_name()))[:1]:
+        # Status arguments depend on the git version, find it in background
+        # before they are built.
+        version = git_version(background=True)
+        if not version:
+            return
+
+        git_rep = GitRepositoryCommand(view.window())
+        git_rep.path = path
+        warm_up(path, git_rep.warm_up_commands(os.path.relpath(view.file_name(), path)))
+        schedule(path, version)
+
+
+def NoteActivity():
+    from .maintenance import note_activity
+    note_activity()
+
+
+def plugin_loaded():
+    # Warm-up waits until the editor has finished its own start.
+    def WarmUpOpenViews():
+        for window in sublime.windows():
+            view = window.active_view()
+            if view:
+                WarmUp(view)
+
+    sublime.set_timeout_async(WarmUpOpenViews, 3000)
+
+
+class VersionControlEventListener(sublime_plugin.EventListener):
+    def on_activated_async(Self, view):
+        NoteActivity()
+        WarmUp(view)
+
+    def on_modified_async(Self, view):
+        NoteActivity()
+
+    def on_selection_modified_async(Self, view):
+        NoteActivity()
+
+    def on_hover(Self, view, point, hover_zone):
+        if hover_zone != sublime.HOVER_TEXT or not view.file_name() or view.is_dirty():
+            return
+
+        for path in FindRepositories(os.path.dirname(view.file_name()))[:1]:
+            if not settings.get("blame_on_hover", path, True):
+                return
+
+            git_rep = GitRepositoryCommand(view.window())
+            git_rep.path = path
+            git_rep.show_line_blame(view, point)
+
 
 class VersionControlCommand(stWindowCommand, Menu):
 
     def _DetermineVersionControlSystem(Self):
         repositories = []
-        path = Self.window.active_view().file_name()
-        while True:
-            # if glob(path + "\\.svn") != []:
-            #     repositories += [SvnRepositoryCommand(Self.window, path)]
-            # if glob(path + "\\.hg") != []:
-            #     repositories += [SvnRepositoryCommand(Self.window, path)]
-            if glob(os.path.join(path, ".git")) != []:
-                git_rep = GitRepositoryCommand(Self.window)
-                git_rep.path = path
-                repositories += [git_rep]
-
-            newpath = os.path.dirname(path)
-            if newpath == path:
-                break
-            path = newpath
+        for path in FindRepositories(os.path.dirname(Self.window.active_view().file_name())):
+            git_rep = GitRepositoryCommand(Self.window)
+            git_rep.path = path
+            repositories += [git_rep]
         return repositories
 
     def run(Self):
+        start = time.time()
         repositories = Self._DetermineVersionControlSystem()
 
         if len(repositories) == 0:
@@ -34,7 +117,16 @@ class VersionControlCommand(stWindowCommand, Menu):
             return
 
         if len(repositories) == 1:
+            from .warmup import is_warm
+            from . import perf
+
             repositories[0].run()
+            state = "warmed up" if is_warm(repositories[0].path) else "cold"
+            _first_menu_timings.setdefault(state, []).append(time.time() - start)
+            # Both states are reported, so cold and warmed up starts can be
+            # compared once each has happened.
+            for state, timings in sorted(_first_menu_timings.items()):
+                perf.report("time to first menu, " + state, timings)
             return
 
         Self.SelectItem(
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+import time
+
+import sublime
+
+from .processes import process_manager
+
+
+class GitStream(object):
+    """Runs git in a worker thread and passes its output to the main thread.
+
+    Output is split by sep and delivered to on_batch in batches, so long
+    running commands can fill a quick panel while they are still working.
+    If git fails, error holds its message once the stream has finished.
+    """
+
+    def __init__(self, path, args, on_batch, on_done=None, sep=b'\n',
+                 batch_size=500, batch_interval=0.5, owner=None):
+        self.path = path
+        self.args = args
+        self.owner = owner
+        self.on_batch = on_batch
+        self.on_done = on_done
+        self.sep = sep
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.process = None
+        self.cancelled = False
+        self.finished = False
+        self.returncode = None
+        self.error = None
+        self._stderr = []
+
+    def start(self):
+        print(" ".join(["git"] + self.args))
+        self.process = process_manager.spawn(
+            self.path,
+            self.args,
+            owner=self.owner,
+            cancellable=True)
+        # Stderr is drained separately, so git never blocks on a full pipe.
+        self._stderr_reader = threading.Thread(target=self._read_stderr, daemon=True)
+        self._stderr_reader.start()
+        threading.Thread(target=self._read, daemon=True).start()
+        return self
+
+    def cancel(self):
+        if self.finished:
+            return
+
+        self.cancelled = True
+        if self.process and self.process.poll() is None:
+            self.process.cancelled = True
+            self.process.kill()
+
+    def is_running(self):
+        return not self.finished and not self.cancelled
+
+    def _deliver(self, items):
+        def impl():
+            if not self.cancelled:
+                self.on_batch(items)
+
+        sublime.set_timeout(impl, 0)
+
+    def _read_stderr(self):
+        self._stderr.append(self.process.stderr.read())
+        self.process.stderr.close()
+
+    def _read(self):
+        fd = self.process.stdout.fileno()
+        rest = b''
+        batch = []
+        flushed = time.time()
+        while True:
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                break
+
+            items = (rest + chunk).split(self.sep)
+            rest = items.pop()
+            batch.extend(i.decode("utf-8", "replace") for i in items)
+            if batch and (len(batch) >= self.batch_size or
+                          time.time() - flushed >= self.batch_interval):
+                self._deliver(batch)
+                batch = []
+                flushed = time.time()
+
+        if rest:
+            batch.append(rest.decode("utf-8", "replace"))
+
+        self.returncode = self.process.wait()
+        self._stderr_reader.join()
+        # Stopped by the process manager (timeout or dismissed menu). The
+        # exit code can not tell, it is 1 for a killed process on Windows.
+        p = self.process
+        if p.cancelled or p.timed_out or p.yielded:
+            self.cancelled = True
+        elif self.returncode != 0 and not self.cancelled:
+            err = b''.join(self._stderr).decode("utf-8", "replace").strip()
+            self.error = err or "git exited with code {}".format(self.returncode)
+        self.process.stdout.close()
+        process_manager.finish(self.path, self.process)
+        if batch:
+            self._deliver(batch)
+
+        def done():
+            self.finished = True
+            if self.on_done and not self.cancelled:
+                self.on_done()
+
+        sublime.set_timeout(done, 0)
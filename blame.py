@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+
+from .cache import LruCache
+from .diagnostics import register_cache
+from .processes import process_manager
+
+
+NOT_COMMITTED = '0' * 40
+
+
+class BlameLine(object):
+    __slots__ = ('commit', 'line', 'author', 'time', 'summary', 'file_name', 'previous')
+
+    def __init__(self, commit, line, info):
+        self.commit = commit
+        self.line = line
+        self.author = info.get('author', '')
+        self.time = int(info.get('author-time', 0))
+        self.summary = info.get('summary', '')
+        self.file_name = info.get('filename', '')
+        previous = info.get('previous')
+        self.previous = tuple(previous.split(' ', 1)) if previous else None
+
+
+def parse_porcelain(out):
+    """Parses "git blame --porcelain" output into a BlameLine per line."""
+    commits = {}
+    lines = []
+    info = None
+    commit = None
+    number = 0
+    for line in out.splitlines():
+        if line.startswith('\t'):
+            lines.append(BlameLine(commit, number, info))
+            commit = None
+        elif commit is None:
+            header = line.split(' ')
+            commit = header[0]
+            number = int(header[2])
+            info = commits.setdefault(commit, {})
+        else:
+            key, _, value = line.partition(' ')
+            info[key] = value
+
+    return lines
+
+
+blame_cache = LruCache(100)
+register_cache("blamed revisions", lambda: len(blame_cache))
+
+# Blames of working tree files by path, HEAD and content id, either the whole
+# file or a window of lines starting at the given one. Failed blames are
+# cached as empty lists.
+line_blame_cache = LruCache(500)
+register_cache("blamed line windows", lambda: len(line_blame_cache))
+
+_content_ids = {}
+
+
+def _content_info(file_name):
+    stat = os.stat(file_name)
+    cached = _content_ids.get(file_name)
+    if cached and cached[0] == (stat.st_mtime, stat.st_size):
+        return cached[1]
+
+    with open(file_name, 'rb') as f:
+        data = f.read()
+    blob = hashlib.sha1('blob {}\0'.format(len(data)).encode() + data).hexdigest()
+    lines = data.count(b'\n') + (1 if data and not data.endswith(b'\n') else 0)
+    _content_ids[file_name] = ((stat.st_mtime, stat.st_size), (blob, lines))
+    return blob, lines
+
+
+def content_id(file_name):
+    """Returns git blob id of the file content, cached while it is not changed."""
+    return _content_info(file_name)[0]
+
+
+def line_count(file_name):
+    """Returns number of lines git blames in the file."""
+    return _content_info(file_name)[1]
+
+
+def _read(file_name):
+    with open(file_name) as f:
+        return f.read().strip()
+
+
+def _git_dirs(path):
+    """Returns the git directory of the work tree and its common directory."""
+    git_dir = os.path.join(path, '.git')
+    if os.path.isfile(git_dir):
+        git_dir = os.path.join(path, _read(git_dir)[len('gitdir:'):].strip())
+
+    common_dir = git_dir
+    if os.path.isfile(os.path.join(git_dir, 'commondir')):
+        common_dir = os.path.join(git_dir, _read(os.path.join(git_dir, 'commondir')))
+
+    return git_dir, common_dir
+
+
+def _resolve_ref(common_dir, ref):
+    try:
+        return _read(os.path.join(common_dir, ref))
+    except OSError:
+        pass
+
+    with open(os.path.join(common_dir, 'packed-refs')) as f:
+        for line in f:
+            if line.rstrip('\n').endswith(' ' + ref):
+                return line.split(' ', 1)[0]
+
+    raise KeyError(ref)
+
+
+def head_id(path):
+    """Returns commit id of HEAD read from the repository files.
+
+    Hover handlers call it on every move of the mouse, so git is started
+    only when HEAD can not be read directly, e.g. for an unborn branch.
+    """
+    try:
+        git_dir, common_dir = _git_dirs(path)
+        head = _read(os.path.join(git_dir, 'HEAD'))
+        if head.startswith('ref:'):
+            head = _resolve_ref(common_dir, head[len('ref:'):].strip())
+        return head
+    except (OSError, KeyError):
+        out = process_manager.run(path, ['rev-parse', '--verify', '-q', 'HEAD'])[0]
+        return out.decode('utf-8').strip() or NOT_COMMITTED
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+from collections import OrderedDict
+import threading
+
+
+class LruCache(object):
+    """Thread safe mapping which keeps only the most recently used items."""
+
+    def __init__(self, size=100):
+        self.size = size
+        self.lock = threading.Lock()
+        self.items = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.items
+
+    def __len__(self):
+        return len(self.items)
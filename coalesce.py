@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+from .diagnostics import register_cache
+
+
+READ_ONLY_COMMANDS = set([
+    'blame',
+    'cat-file',
+    'diff',
+    'diff-tree',
+    'for-each-ref',
+    'log',
+    'ls-files',
+    'rev-parse',
+    'show',
+    'status',
+    'version',
+])
+
+
+def command_args(args):
+    """Strips leading "-c name=value" options from git arguments."""
+    while len(args) >= 2 and args[0] == '-c':
+        args = args[2:]
+
+    return args
+
+
+def is_read_only(args):
+    args = command_args(args)
+    if not args:
+        return False
+
+    name, options = args[0], args[1:]
+    if name in READ_ONLY_COMMANDS:
+        return True
+
+    if name == 'branch':
+        return all(o in ('-a', '--all', '-r', '--remotes', '-l', '--list', '-v', '-vv') for o in options)
+
+    if name == 'tag':
+        return not options or options[0] in ('-l', '--list')
+
+    if name == 'config':
+        return (
+            any(o in ('--get', '--get-all', '-l', '--list') for o in options) or
+            (len(options) == 1 and not options[0].startswith('-')))
+
+    return False
+
+
+class _Call(object):
+    def __init__(self):
+        self.event = threading.Event()
+        self.waiters = 0
+        self.result = None
+        self.error = None
+
+
+class RequestCoalescer(object):
+    """Shares one git process between identical concurrent read-only calls.
+
+    Commands which are not read-only act as barriers: they start a new
+    generation of the repository, and reads from different generations are
+    never shared.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.generations = {}
+        self.requests = 0
+        self.hits = 0
+        self.coalesced = 0
+        self.barriers = 0
+
+    def _barrier(self, path):
+        with self.lock:
+            self.generations[path] = self.generations.get(path, 0) + 1
+
+    def run(self, path, args, func):
+        if not is_read_only(args):
+            with self.lock:
+                self.barriers += 1
+
+            self._barrier(path)
+            try:
+                return func()
+            finally:
+                self._barrier(path)
+
+        with self.lock:
+            self.requests += 1
+            key = (path, self.generations.get(path, 0), tuple(args))
+            call = self.in_flight.get(key)
+            owner = call is None
+            if owner:
+                call = self.in_flight[key] = _Call()
+            else:
+                self.hits += 1
+                call.waiters += 1
+                if call.waiters == 1:
+                    self.coalesced += 1
+
+        if not owner:
+            call.event.wait()
+            if call.error:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+            call.event.set()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'hits': self.hits,
+                'coalesced': self.coalesced,
+                'barriers': self.barriers,
+                'in_flight': len(self.in_flight),
+            }
+
+
+coalescer = RequestCoalescer()
+register_cache("git requests in flight", lambda: len(coalescer.in_flight))
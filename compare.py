@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+
+class ChangedFile(object):
+    __slots__ = ('status', 'path', 'old_path', 'added', 'deleted', 'action')
+
+    def __init__(self, status, path, old_path=None):
+        self.status = status
+        self.path = path
+        self.old_path = old_path
+        self.added = None
+        self.deleted = None
+        self.action = None
+
+
+class Comparison(object):
+    """Changed files between two revisions, filled from streamed
+    "git diff-tree -r -z --raw" and "git diff-tree -r -z --numstat" output.
+    """
+
+    def __init__(self, base, target):
+        self.base = base
+        self.target = target
+        self.files = []
+        self.by_path = {}
+        self.counts = {}
+        self.streams = []
+        self._raw = []
+        self._numstat = []
+
+    def is_running(self):
+        return any(s.is_running() for s in self.streams)
+
+    def is_cancelled(self):
+        return any(s.cancelled for s in self.streams)
+
+    @property
+    def error(self):
+        return next((s.error for s in self.streams if s.error), None)
+
+    def cancel(self):
+        for s in self.streams:
+            s.cancel()
+
+    def add_raw(self, tokens):
+        """Returns files completed by the tokens."""
+        added = []
+        pending = self._raw
+        for token in tokens:
+            if not pending:
+                if token.startswith(':'):
+                    pending.append(token.rsplit(' ', 1)[-1])
+                continue
+
+            pending.append(token)
+            status = pending[0]
+            if len(pending) == (3 if status[0] in 'RC' else 2):
+                f = ChangedFile(status[0], pending[-1], pending[1] if len(pending) == 3 else None)
+                self.files.append(f)
+                self.by_path[f.path] = f
+                added.append(f)
+                del pending[:]
+
+        # Counts may be streamed before the file itself.
+        for f in added:
+            self._apply_counts(f)
+
+        return added
+
+    def add_numstat(self, tokens):
+        """Returns files which got their counts."""
+        updated = []
+        pending = self._numstat
+        for token in tokens:
+            if not pending:
+                if not token:
+                    continue
+                added, deleted, path = token.split('\t', 2)
+                pending.extend([added, deleted])
+                if not path:
+                    continue
+            else:
+                path = token
+                if len(pending) == 2:
+                    pending.append(path)
+                    continue
+
+            self.counts[path] = (pending[0], pending[1])
+            f = self.by_path.get(path)
+            if f:
+                self._apply_counts(f)
+                updated.append(f)
+            del pending[:]
+
+        return updated
+
+    def _apply_counts(self, f):
+        counts = self.counts.get(f.path)
+        if counts:
+            f.added, f.deleted = counts
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+import gc
+import os
+
+
+PACKAGE_PATH = os.path.dirname(os.path.abspath(__file__))
+
+_caches = {}
+_snapshots = []
+
+
+def register_cache(name, size):
+    """Registers a plugin cache, size is called to get its number of items."""
+    _caches[name] = size
+
+
+def cache_sizes():
+    return sorted((name, size()) for name, size in _caches.items())
+
+
+def live_instances(classes):
+    """Returns number of alive objects for each of the classes."""
+    counts = dict((cls.__name__, 0) for cls in classes)
+    for obj in gc.get_objects():
+        for cls in classes:
+            if isinstance(obj, cls):
+                counts[cls.__name__] += 1
+
+    return sorted(counts.items())
+
+
+def take_snapshot():
+    """Takes a snapshot of memory allocated by the plugin's modules.
+
+    Tracing is started by the first call, so that snapshot shows only
+    allocations made after it.
+    """
+    import tracemalloc
+
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(10)
+
+    gc.collect()
+    snapshot = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(True, os.path.join(PACKAGE_PATH, '*')),
+    ])
+    _snapshots.append(snapshot)
+    del _snapshots[:-2]
+    return snapshot
+
+
+def stop_tracing():
+    import tracemalloc
+
+    del _snapshots[:]
+    tracemalloc.stop()
+
+
+def _site(frame):
+    return "{}:{}".format(os.path.relpath(frame.filename, PACKAGE_PATH), frame.lineno)
+
+
+def report_snapshot(snapshot, limit=20):
+    stats = snapshot.statistics('lineno')
+    print("[memory] {:.1f} KiB in {} blocks allocated by the plugin".format(
+        sum(s.size for s in stats) / 1024.0, sum(s.count for s in stats)))
+    for s in stats[:limit]:
+        print("[memory] {:>10.1f} KiB {:>8} blocks  {}".format(
+            s.size / 1024.0, s.count, _site(s.traceback[0])))
+
+
+def report_difference(limit=20):
+    if len(_snapshots) < 2:
+        print("[memory] take two snapshots to compare them")
+        return
+
+    old, new = _snapshots
+    stats = new.compare_to(old, 'lineno')
+    print("[memory] {:+.1f} KiB allocated by the plugin since previous snapshot".format(
+        sum(s.size_diff for s in stats) / 1024.0))
+    for s in stats[:limit]:
+        print("[memory] {:>+10.1f} KiB {:>+8} blocks  {}".format(
+            s.size_diff / 1024.0, s.count_diff, _site(s.traceback[0])))
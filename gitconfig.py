@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+
+from .coalesce import coalescer
+from .processes import process_manager
+from .diagnostics import register_cache
+
+
+def _normalize_key(key):
+    # Section and variable names are case insensitive, subsections are not.
+    parts = key.split('.')
+    parts[0] = parts[0].lower()
+    parts[-1] = parts[-1].lower()
+    return '.'.join(parts)
+
+
+def _mtime(file_name):
+    try:
+        return os.path.getmtime(file_name)
+    except OSError:
+        return None
+
+
+class ConfigSnapshot(object):
+    """Parsed output of "git config --list -z --show-origin".
+
+    The snapshot remembers modification times of all config files it was
+    read from and becomes stale as soon as any of them changes.
+    """
+
+    def __init__(self, path, out):
+        self.values = {}
+        self.files = {}
+
+        watched = [
+            os.path.join(path, '.git', 'config'),
+            os.path.expanduser('~/.gitconfig'),
+            os.path.join(
+                os.environ.get('XDG_CONFIG_HOME') or os.path.expanduser('~/.config'),
+                'git',
+                'config'),
+        ]
+
+        items = out.split('\0')
+        for i in range(0, len(items) - 1, 2):
+            origin, entry = items[i], items[i + 1]
+            key, _, value = entry.partition('\n')
+            self.values.setdefault(_normalize_key(key), []).append(value)
+            if origin.startswith('file:'):
+                watched.append(os.path.join(path, origin[len('file:'):]))
+
+        for file_name in watched:
+            file_name = os.path.normpath(file_name)
+            self.files[file_name] = _mtime(file_name)
+
+    def is_stale(self):
+        return any(_mtime(f) != mtime for f, mtime in self.files.items())
+
+    def get(self, key, default=None):
+        values = self.values.get(_normalize_key(key))
+        return values[-1] if values else default
+
+    def get_all(self, key):
+        return list(self.values.get(_normalize_key(key), []))
+
+    def get_bool(self, key, default=False):
+        value = self.get(key)
+        if value is None:
+            return default
+
+        return value.lower() in ('', 'true', 'yes', 'on', '1')
+
+    def get_int(self, key, default=0):
+        value = self.get(key)
+        if not value:
+            return default
+
+        multiplier = {'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}.get(value[-1].lower(), 1)
+        try:
+            return int(value[:-1] if multiplier > 1 else value) * multiplier
+        except ValueError:
+            return default
+
+
+_snapshots = {}
+_lock = threading.Lock()
+register_cache("git config snapshots", lambda: len(_snapshots))
+
+
+def config_snapshot(path, background=False):
+    """Returns the config snapshot of the repository at path.
+
+    A background read is not shared with interactive callers, since it is
+    stopped as soon as any of them starts git. It returns None if it was
+    stopped or failed, and nothing is cached then.
+    """
+    with _lock:
+        snapshot = _snapshots.get(path)
+    if snapshot and not snapshot.is_stale():
+        return snapshot
+
+    args = ['config', '--list', '-z', '--show-origin']
+    if background:
+        p = process_manager.spawn(path, args, background=True)
+        try:
+            out = p.communicate()[0]
+        finally:
+            process_manager.finish(path, p)
+        if p.yielded or p.returncode != 0:
+            return None
+    else:
+        out = coalescer.run(path, args, lambda: process_manager.run(path, args))[0]
+
+    snapshot = ConfigSnapshot(path, out.decode('utf-8', 'replace'))
+    with _lock:
+        _snapshots[path] = snapshot
+
+    return snapshot
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+from bisect import bisect_left
+import re
+
+
+def _translate(pattern):
+    """Translates gitignore glob into a regular expression body."""
+    result = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith('**/', i):
+            result.append('(?:.*/)?')
+            i += 3
+            continue
+
+        if pattern.startswith('/**', i) and i + 3 == n:
+            result.append('/.*')
+            i += 3
+            continue
+
+        if c == '*':
+            result.append('[^/]*')
+        elif c == '?':
+            result.append('[^/]')
+        elif c == '[':
+            end = pattern.find(']', i + 2)
+            if end < 0:
+                result.append('\\[')
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                result.append('[' + body.replace('\\', '\\\\') + ']')
+                i = end
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            result.append(re.escape(pattern[i]))
+        else:
+            result.append(re.escape(c))
+        i += 1
+
+    return ''.join(result)
+
+
+class Pattern(object):
+    """Single compiled .gitignore pattern.
+
+    A path matches if the pattern matches the path itself or any of its
+    parent folders, as git ignores everything inside an ignored folder.
+    """
+
+    def __init__(self, pattern):
+        pattern = pattern.strip()
+        self.negative = pattern.startswith('!')
+        if self.negative:
+            pattern = pattern[1:]
+
+        self.directory = pattern.endswith('/')
+        pattern = pattern.rstrip('/')
+        self.anchored = '/' in pattern
+        pattern = pattern.lstrip('/')
+
+        body = _translate(pattern)
+        suffix = '/.*' if self.directory else '(?:/.*)?'
+        prefix = '' if self.anchored else '(?:.*/)?'
+        self.regex = re.compile(prefix + body + suffix + '$')
+        self.match = self.regex.match
+
+        # Anchored patterns can only match paths starting with their
+        # literal part, so a sorted listing is narrowed down by bisection.
+        self.literal_prefix = ''
+        if self.anchored:
+            self.literal_prefix = re.split(r'[*?\[\\]', pattern, 1)[0]
+
+    def count(self, paths):
+        """Returns number of matches in the sorted list of paths."""
+        match = self.match
+        if not self.literal_prefix:
+            return sum(1 for p in paths if match(p))
+
+        prefix = self.literal_prefix
+        count = 0
+        for i in range(bisect_left(paths, prefix), len(paths)):
+            p = paths[i]
+            if not p.startswith(prefix):
+                break
+            if match(p):
+                count += 1
+
+        return count
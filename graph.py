@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+
+class LaneGraph(object):
+    """Assigns commits of a log to graph lanes page by page.
+
+    Commits must come children first (as git log --date-order prints them).
+    Between pages only the list of active lanes is kept, each lane holds the
+    hash of the commit expected next in it, so memory does not depend on
+    the history length.
+    """
+
+    COMMIT = '*'
+    LANE = '|'
+    JOIN = '/'
+    FORK = '\\'
+    EMPTY = ' '
+
+    def __init__(self):
+        self.lanes = []
+        self.max_lanes = 0
+
+    def add(self, commit, parents):
+        """Places commit into a lane and returns glyphs of its row."""
+        lanes = self.lanes
+        column = None
+        joined = []
+        for i, expected in enumerate(lanes):
+            if expected == commit:
+                if column is None:
+                    column = i
+                else:
+                    joined.append(i)
+
+        if column is None:
+            column = lanes.index(None) if None in lanes else len(lanes)
+            if column == len(lanes):
+                lanes.append(None)
+
+        glyphs = [self.EMPTY if expected is None else self.LANE for expected in lanes]
+        glyphs[column] = self.COMMIT
+        for i in joined:
+            glyphs[i] = self.JOIN
+            lanes[i] = None
+
+        # The first parent always continues the commit's lane, even if
+        # another lane expects it too, so both lanes join at the parent.
+        lanes[column] = parents[0] if parents else None
+        for parent in parents[1:]:
+            if parent in lanes:
+                continue
+
+            slot = lanes.index(None) if None in lanes else len(lanes)
+            if slot == len(lanes):
+                lanes.append(None)
+                glyphs.append(self.EMPTY)
+            lanes[slot] = parent
+            if glyphs[slot] == self.EMPTY:
+                glyphs[slot] = self.FORK
+
+        while lanes and lanes[-1] is None:
+            lanes.pop()
+
+        self.max_lanes = max(self.max_lanes, len(lanes))
+        return ''.join(glyphs).rstrip()
+
+    def add_page(self, commits):
+        """Processes a page of (hash, parents) pairs, returns their rows."""
+        return [self.add(commit, parents) for commit, parents in commits]
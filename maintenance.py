@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+import sublime
+
+from . import perf
+from . import settings
+from .processes import process_manager
+
+
+# Tasks with the minimal git version supporting them.
+TASKS = [
+    ((2, 27), ['commit-graph', 'write', '--reachable', '--changed-paths']),
+    ((2, 21), ['multi-pack-index', 'write']),
+    ((2, 21), ['multi-pack-index', 'expire']),
+    ((2, 34), ['repack', '-d', '-l', '--geometric=2', '--write-midx']),
+]
+
+CHECK_INTERVAL = 60
+
+# Seconds before a repository whose task failed is maintained again.
+RETRY_DELAY = 3600
+
+_lock = threading.Lock()
+_repositories = {}
+_last_activity = 0
+_running = False
+_scheduled = False
+
+
+def note_activity():
+    global _last_activity
+    _last_activity = time.time()
+
+
+def note_path(path, file_name):
+    """Remembers file used in path limited history to time it later."""
+    with _lock:
+        if path in _repositories:
+            _repositories[path]['file'] = file_name
+
+
+def schedule(path, version):
+    """Adds the repository to idle-time maintenance if it is enabled."""
+    global _scheduled
+    if not settings.get("idle_maintenance", path, False):
+        return
+
+    with _lock:
+        if path not in _repositories:
+            _repositories[path] = {'done': 0, 'failed': 0, 'file': None, 'version': version}
+
+        if not _scheduled:
+            _scheduled = True
+            sublime.set_timeout_async(_check, CHECK_INTERVAL * 1000)
+
+
+def _idle_for():
+    return time.time() - max(_last_activity, process_manager.last_interactive)
+
+
+def _check():
+    global _running
+    sublime.set_timeout_async(_check, CHECK_INTERVAL * 1000)
+    if _running:
+        return
+
+    now = time.time()
+    with _lock:
+        due = [
+            path for path, state in _repositories.items()
+            if now - state['done'] >= settings.get("idle_maintenance_interval", path, 86400) and
+            now - state['failed'] >= RETRY_DELAY and
+            _idle_for() >= settings.get("idle_maintenance_delay", path, 300)
+        ]
+
+    if due:
+        _running = True
+        threading.Thread(target=_maintain, args=(due,), daemon=True).start()
+
+
+def _time_log(path, file_name):
+    args = ['log', '--format=%h', '-100', '--', file_name]
+    return perf.measure(lambda: process_manager.run(path, args, background=True), repeat=3)
+
+
+def _maintain(paths):
+    global _running
+    try:
+        for path in paths:
+            if not _maintain_repository(path):
+                return
+    finally:
+        _running = False
+
+
+def _maintain_repository(path):
+    """Runs all tasks, returns False if the user interrupted them.
+
+    A failed task does not stop the others, but the repository is not
+    marked as maintained then and is tried again after RETRY_DELAY.
+    """
+    state = _repositories[path]
+    file_name = state['file']
+    before = _time_log(path, file_name) if file_name else None
+    failed = False
+
+    for version, args in TASKS:
+        if state['version'] < version:
+            continue
+
+        if _idle_for() < settings.get("idle_maintenance_delay", path, 300):
+            return False
+
+        p = process_manager.spawn(path, args, background=True)
+        try:
+            err = p.communicate()[1]
+        finally:
+            process_manager.finish(path, p)
+        if p.yielded:
+            print("[perf] maintenance of {} yielded to an interactive git call".format(path))
+            return False
+
+        if p.returncode != 0:
+            print("[perf] maintenance of {} failed, git {}: {}".format(
+                path, " ".join(args), err.decode("utf-8", "replace").strip()))
+            failed = True
+
+    if failed:
+        state['failed'] = time.time()
+        return True
+
+    state['done'] = time.time()
+    print("[perf] maintenance of {} finished".format(path))
+    if before:
+        perf.report("path limited log of " + file_name + " before maintenance", before)
+        perf.report("path limited log of " + file_name + " after maintenance", _time_log(path, file_name))
+
+    return True
@@ -8,10 +8,11 @@ from .st3_CommandsBase.WindowCommand import stWindowCommand
 
 
 class Action(object):
-    def __init__(self, text, func, id=None):
+    def __init__(self, text, func, id=None, preview=None):
         self.id = id if id else text
         self.text = text
         self.func = func
+        self.preview = preview
 
     def isCheckbox(self):
         return False
@@ -42,7 +43,8 @@ def  menu(refresh=False, temp=False):
             return self.menu(
                 getActions=partial(getActions, self, *args, **kwargs),
                 refresh=refresh,
-                temp=temp)
+                temp=temp,
+                name=getActions.__name__)
 
         return impl
 
@@ -62,7 +64,9 @@ def action(terminate=False):
 
 
 class Menu:
-    def menu(self, getActions, refresh=False, temp=False):
+    _activeMenu = None
+
+    def menu(self, getActions, refresh=False, temp=False, name=None):
         def impl(parent=None, selectedId=None, options=None):
             actions = getActions()
             defaultSelectedId = None
@@ -96,7 +100,36 @@ class Menu:
                 return [cb.id for cb in options if cb.checked]
 
             def show(selectedIndex):
+                highlighted = [selectedIndex]
+
+                def refreshMenu():
+                    impl(parent=parent, selectedId=actions[highlighted[0]].id)
+
+                # Showing a new quick panel closes the previous one with
+                # index -1, so callbacks of a replaced panel are ignored.
+                self._activeMenu = (name, refreshMenu)
+
+                def isActive():
+                    return self._activeMenu is not None and self._activeMenu[1] is refreshMenu
+
+                def onHighlight(index):
+                    if isActive():
+                        highlighted[0] = index
+                        self.onMenuHighlight(actions, index)
+
+                def onCancel():
+                    if not isActive():
+                        return
+
+                    self._activeMenu = None
+                    self.onMenuCancel()
+
                 def onSelect(index):
+                    if not isActive():
+                        return
+
+                    self._activeMenu = None
+                    self.onMenuSelect(actions, index)
                     if parent and index == 0:
                         parent()
                         return
@@ -112,7 +145,9 @@ class Menu:
                 self.SelectItem(
                     [a.text for a in actions],
                     onSelect,
-                    selectedIndex=selectedIndex)
+                    OnCancel=onCancel,
+                    selectedIndex=selectedIndex,
+                    OnHighlight=onHighlight)
 
             show(selectedIndex)
 
@@ -130,6 +165,24 @@ class Menu:
 
         return impl
 
+    def refreshMenu(self, name=None):
+        """Shows the opened menu again with freshly built actions.
+
+        If name is given the menu is refreshed only when it was built by the
+        @menu method with this name.
+        """
+        if self._activeMenu and (name is None or self._activeMenu[0] == name):
+            self._activeMenu[1]()
+
+    def onMenuCancel(self):
+        pass
+
+    def onMenuHighlight(self, actions, index):
+        pass
+
+    def onMenuSelect(self, actions, index):
+        pass
+
     def none(self):
         def impl(parent, selectedId, options):
             pass
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+
+def measure(func, repeat=1):
+    timings = []
+    for i in range(repeat):
+        start = time.time()
+        func()
+        timings.append(time.time() - start)
+
+    return timings
+
+
+def report(label, timings):
+    timings = sorted(timings)
+    print("[perf] {}: min {:.1f} ms, median {:.1f} ms, max {:.1f} ms ({} runs)".format(
+        label,
+        timings[0] * 1000,
+        timings[len(timings) // 2] * 1000,
+        timings[-1] * 1000,
+        len(timings)))
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+import threading
+
+import sublime
+
+from .cache import LruCache
+from .diagnostics import register_cache
+from .processes import process_manager
+
+
+PANEL_NAME = "git_preview"
+PREFETCH = 2
+
+preview_cache = LruCache(200)
+register_cache("previews", lambda: len(preview_cache))
+
+
+class Previewer(object):
+    """Shows output of git commands for highlighted menu entries.
+
+    Each entry is previewed by git arguments. Output is fetched in the
+    background and cached, entries around the highlighted one are
+    prefetched, and fetches which are too far from it are killed.
+    """
+
+    def __init__(self, window, path, owner):
+        self.window = window
+        self.path = path
+        self.owner = owner
+        self.current = None
+        self.lock = threading.Lock()
+        self.fetching = {}
+
+    def highlight(self, previews, index):
+        self.current = previews[index]
+        wanted = [
+            p for p in previews[max(0, index - PREFETCH):index + PREFETCH + 1]
+            if p is not None]
+
+        with self.lock:
+            stale = [p for key, p in self.fetching.items() if key not in wanted]
+        for p in stale:
+            p.kill()
+
+        if self.current is None:
+            self.hide()
+            return
+
+        text = preview_cache.get((self.path,) + self.current)
+        self.show(text if text is not None else "Loading...")
+
+        # The highlighted entry goes first, then its neighbours.
+        for args in sorted(wanted, key=lambda a: a != self.current):
+            self.fetch(args)
+
+    def fetch(self, args):
+        key = (self.path,) + args
+        with self.lock:
+            if key in preview_cache or args in self.fetching:
+                return
+
+            p = process_manager.spawn(self.path, list(args), owner=self.owner, cancellable=True)
+            self.fetching[args] = p
+
+        def impl():
+            try:
+                out, err = p.communicate()
+            finally:
+                process_manager.finish(self.path, p)
+                with self.lock:
+                    self.fetching.pop(args, None)
+
+            if p.returncode != 0:
+                return
+
+            text = out.decode("utf-8", "replace")
+            preview_cache.put(key, text)
+            if args == self.current:
+                sublime.set_timeout(lambda: args == self.current and self.show(text), 0)
+
+        threading.Thread(target=impl, daemon=True).start()
+
+    def show(self, text):
+        view = self.window.find_output_panel(PANEL_NAME) or self.window.create_output_panel(PANEL_NAME)
+        view.assign_syntax("Packages/Diff/Diff.sublime-syntax")
+        view.run_command("version_control_replace_content", {"text": text})
+        self.window.run_command("show_panel", {"panel": "output." + PANEL_NAME})
+
+    def hide(self):
+        if self.window.active_panel() == "output." + PANEL_NAME:
+            self.window.run_command("hide_panel", {"panel": "output." + PANEL_NAME})
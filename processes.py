@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+
+import os
+import subprocess
+import threading
+import time
+
+from . import settings
+from .coalesce import command_args, is_read_only
+from .diagnostics import register_cache
+
+
+BELOW_NORMAL_PRIORITY_CLASS = 0x00004000
+
+# Seconds a terminated git gets to remove its lock files before it is killed.
+TERMINATE_GRACE_PERIOD = 5
+
+DEFAULT_TIMEOUTS = {
+    "default": 60,
+    "fetch": 600,
+    "pull": 600,
+    "push": 600,
+    "difftool": 0,
+    "commit-graph": 1800,
+    "multi-pack-index": 1800,
+    "repack": 1800,
+}
+
+
+def time_budget(path, args):
+    """Returns the time limit in seconds for a git command, 0 means no limit.
+
+    The default limit applies only to read-only commands, others are
+    limited only when they have their own entry.
+    """
+    timeouts = dict(DEFAULT_TIMEOUTS)
+    timeouts.update(settings.get("git_timeouts", path, {}))
+    name = (command_args(args) or [None])[0]
+    if name in timeouts:
+        return timeouts[name] or 0
+
+    return (timeouts["default"] or 0) if is_read_only(args) else 0
+
+
+def _lower_priority(p):
+    # Done after the start rather than in preexec_fn, which is not safe
+    # in the threaded plugin host.
+    try:
+        os.setpriority(os.PRIO_PROCESS, p.pid, 10)
+    except OSError:
+        # The process has already finished.
+        pass
+
+
+def _environment():
+    env = dict(os.environ)
+    env["GIT_TERMINAL_PROMPT"] = "0"
+    return env
+
+
+class ProcessManager(object):
+    """Keeps track of every git process started by the plugin.
+
+    Processes are registered per repository, killed when they exceed their
+    time budget or when the menu which started them is dismissed, and
+    reaped when they finish.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.processes = {}
+        self.last_interactive = 0
+
+    def spawn(self, path, args, owner=None, cancellable=False, stdin=None, stdout=subprocess.PIPE,
+              stderr=subprocess.PIPE, timeout=None, background=False):
+        self.reap()
+        if not background:
+            self.last_interactive = time.time()
+            self.yield_background()
+
+        options = {}
+        if background and os.name == "nt":
+            options["creationflags"] = BELOW_NORMAL_PRIORITY_CLASS
+
+        p = subprocess.Popen(
+            ["git"] + args,
+            stdin=stdin if stdin is not None else subprocess.DEVNULL,
+            stdout=stdout,
+            stderr=stderr,
+            cwd=path,
+            env=_environment(),
+            **options)
+        if background and os.name != "nt":
+            _lower_priority(p)
+        p.git_args = args
+        p.owner = owner
+        p.cancellable = cancellable
+        p.background = background
+        p.yielded = False
+        p.detached = False
+        p.started = time.time()
+        p.timed_out = False
+        p.cancelled = False
+        p.timer = None
+
+        if timeout is None:
+            timeout = time_budget(path, args)
+        if timeout:
+            def on_timeout():
+                if p.poll() is None:
+                    p.timed_out = True
+                    p.terminate()
+                    kill = threading.Timer(
+                        TERMINATE_GRACE_PERIOD,
+                        lambda: p.poll() is None and p.kill())
+                    kill.daemon = True
+                    kill.start()
+
+            p.timer = threading.Timer(timeout, on_timeout)
+            p.timer.daemon = True
+            p.timer.start()
+
+        with self.lock:
+            self.processes.setdefault(path, set()).add(p)
+
+        return p
+
+    def finish(self, path, p):
+        if p.timer:
+            p.timer.cancel()
+
+        with self.lock:
+            self.processes.get(path, set()).discard(p)
+
+    def run(self, path, args, owner=None, cancellable=False, timeout=None, input=None, background=False):
+        """Runs git and returns its (stdout, stderr) as bytes."""
+        p = self.spawn(
+            path,
+            args,
+            owner=owner,
+            cancellable=cancellable,
+            stdin=subprocess.PIPE if input is not None else None,
+            timeout=timeout,
+            background=background)
+        try:
+            out, err = p.communicate(input)
+        finally:
+            self.finish(path, p)
+
+        if p.timed_out:
+            err += "git {} was stopped after {:.0f} s\n".format(
+                " ".join(args), time.time() - p.started).encode("utf-8")
+
+        return out, err
+
+    def start(self, path, args, owner=None):
+        """Starts git without waiting for it, the process is reaped in background."""
+        p = self.spawn(path, args, owner=owner, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        p.detached = True
+
+        def wait():
+            p.wait()
+            self.finish(path, p)
+
+        threading.Thread(target=wait, daemon=True).start()
+        return p
+
+    def cancel(self, owner):
+        """Kills cancellable processes started on behalf of owner."""
+        with self.lock:
+            processes = [
+                p for ps in self.processes.values() for p in ps
+                if p.owner is owner and p.cancellable]
+
+        for p in processes:
+            if p.poll() is None:
+                p.cancelled = True
+                p.kill()
+
+    def reap(self):
+        with self.lock:
+            for path, ps in self.processes.items():
+                for p in [p for p in ps if p.poll() is not None]:
+                    if p.timer:
+                        p.timer.cancel()
+                    ps.discard(p)
+
+    def yield_background(self):
+        """Stops background processes to give way to an interactive one.
+
+        They are terminated rather than killed, so git can remove its lock
+        files.
+        """
+        for path, p in self.running():
+            if p.background:
+                p.yielded = True
+                p.terminate()
+
+    def is_busy(self):
+        """Returns True while any git process the user waits for runs.
+
+        Detached processes like difftool may stay open for hours and do
+        not count.
+        """
+        return any(not p.background and not p.detached for path, p in self.running())
+
+    def running(self):
+        self.reap()
+        with self.lock:
+            return [(path, p) for path, ps in self.processes.items() for p in ps]
+
+
+process_manager = ProcessManager()
+register_cache("tracked git processes", lambda: len(process_manager.running()))
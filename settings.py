@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import sublime
+
+
+SETTINGS_FILE = "VersionControl.sublime-settings"
+
+
+def _same_path(a, b):
+    return os.path.normcase(os.path.abspath(os.path.expanduser(a))) == \
+        os.path.normcase(os.path.abspath(b))
+
+
+def get(key, path=None, default=None):
+    """Returns the plugin setting for the repository at path.
+
+    Values from the "repositories" section of the settings, keyed by
+    repository path, override the global ones.
+    """
+    settings = sublime.load_settings(SETTINGS_FILE)
+    if path:
+        for repository, overrides in settings.get("repositories", {}).items():
+            if key in overrides and _same_path(repository, path):
+                return overrides[key]
+
+    return settings.get(key, default)
@@ -4,12 +4,13 @@ def NoneFunction():
     return
 
 class stWindowCommand(sublime_plugin.WindowCommand):
-    def SelectItem(Self, Items, OnSelect, OnCancel = NoneFunction, Flags=sublime.KEEP_OPEN_ON_FOCUS_LOST, selectedIndex=0):
+    def SelectItem(Self, Items, OnSelect, OnCancel = NoneFunction, Flags=sublime.KEEP_OPEN_ON_FOCUS_LOST, selectedIndex=0, OnHighlight=None):
 
         sublime.set_timeout(
             lambda: Self.window.show_quick_panel(
                 Items,
                 lambda index: OnSelect(index) if index > -1 else OnCancel(),
                 Flags,
-                selected_index=selectedIndex),
+                selected_index=selectedIndex,
+                on_highlight=OnHighlight),
             0)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+from .gitconfig import config_snapshot
+from .processes import process_manager
+
+
+# Repository is not warmed up again for this number of seconds.
+WARM_UP_INTERVAL = 300
+
+_lock = threading.Lock()
+_queue = []
+_started = {}
+_warmed = set()
+_worker = None
+
+
+def is_warm(path):
+    return path in _warmed
+
+
+def warm_up(path, commands):
+    """Queues repository for warming up in background.
+
+    commands are git arguments of the very calls the first menus make.
+    Their output is dropped, it would be stale by the time a menu opens,
+    but the files git reads for them are in the OS file cache then. The
+    config snapshot, which the menus share, is loaded as well.
+    """
+    global _worker
+    with _lock:
+        if time.time() - _started.get(path, 0) < WARM_UP_INTERVAL:
+            return
+
+        _started[path] = time.time()
+        _queue.append((path, commands))
+        if _worker is None:
+            _worker = threading.Thread(target=_work, daemon=True)
+            _worker.start()
+
+
+def _wait_until_idle():
+    # Interactive git calls always go first.
+    while process_manager.is_busy():
+        time.sleep(0.5)
+
+
+def _work():
+    global _worker
+    while True:
+        with _lock:
+            if not _queue:
+                _worker = None
+                return
+            path, commands = _queue.pop(0)
+
+        start = time.time()
+        _wait_until_idle()
+        config_snapshot(path, background=True)
+        for args in commands:
+            _wait_until_idle()
+            process_manager.run(path, args, owner=_work, cancellable=True, background=True)
+
+        with _lock:
+            _warmed.add(path)
+        print("[perf] warmed up {} in {:.0f} ms".format(path, (time.time() - start) * 1000))